@@ -0,0 +1,168 @@
+"""
+Command line runner for the simulation model. It runs several replications of the scenarios of one or more
+scenario files and writes the mean and the confidence interval for the mean of each output as JSON, CSV or Parquet.
+
+    python cli.py scenarios/scenario_0.json scenarios/scenario_1.json --replications 20 --workers 4 --format csv
+
+A scenario file is a JSON file with the parameters of run_several_replications (without alpha, num_replications
+and executor). The scenario takes the name of the file. A file can also have several scenarios:
+
+    {"defaults": {...parameters shared by all the scenarios...}, "scenarios": {"name": {...parameters...}, ...}}
+"""
+# Import from libraries
+import os
+import sys
+import json
+import logging
+import inspect
+import argparse
+import importlib.util
+import pandas as pd
+
+# Import from files
+from run_several_replications import run_scenarios
+from simulation_model import SimulationModel, results_summary
+from executors import InProcessExecutor, LocalProcessExecutor, FileQueueExecutor
+
+
+def read_scenarios(paths):
+    """Returns a dictionary {scenario_name: parameters} with the scenarios of the scenario files"""
+
+    scenarios = {}
+    for path in paths:
+        with open(path) as file:
+            try:
+                content = json.load(file)
+            except json.JSONDecodeError as error:
+                raise ValueError(f'{path} is not a valid JSON file: {error}')
+        if 'scenarios' in content:
+            defaults = content.get('defaults', {})
+            file_scenarios = {name: {**defaults, **parameters} for name, parameters in content['scenarios'].items()}
+        else:
+            file_scenarios = {os.path.splitext(os.path.basename(path))[0]: content}
+        for name, parameters in file_scenarios.items():
+            if name in scenarios:
+                raise ValueError(f'Scenario {name!r} is defined more than once')
+            scenarios[name] = parameters
+    return scenarios
+
+
+def check_scenario(scenario_name, parameters):
+    """Returns a list with the problems of the parameters of a scenario: parameters that SimulationModel does not
+    have and required parameters that are missing (simulation_time is also required)"""
+
+    model_parameters = inspect.signature(SimulationModel).parameters
+    known = set(model_parameters) | {'simulation_time'}
+    required = {name for name, parameter in model_parameters.items() if parameter.default is parameter.empty}
+    required.add('simulation_time')
+
+    problems = []
+    unknown = sorted(set(parameters) - known)
+    if unknown:
+        problems.append(f'scenario {scenario_name!r} has unknown parameters {unknown}')
+    missing = sorted(required - set(parameters))
+    if missing:
+        problems.append(f'scenario {scenario_name!r} is missing the parameters {missing}')
+    return problems
+
+
+def create_executor(workers, queue_dir):
+    """Returns the executor to run the replications (see executors.py)"""
+    if queue_dir is not None:
+        return FileQueueExecutor(queue_dir, num_local_workers=workers)
+    if workers > 1:
+        return LocalProcessExecutor(num_workers=workers)
+    return InProcessExecutor()
+
+
+def write_results(df, output, output_format):
+    """Writes the results in the output file (or in the standard output for JSON and CSV)"""
+    if output_format == 'json':
+        text = df.to_json(orient='records', indent=2)
+        if output is None:
+            sys.stdout.write(text + '\n')
+        else:
+            with open(output, 'w') as file:
+                file.write(text)
+    elif output_format == 'csv':
+        df.to_csv(output if output is not None else sys.stdout, index=False)
+    else:
+        df.to_parquet(output, index=False)
+
+
+def parse_arguments(argv):
+    """Returns the arguments of the command line"""
+
+    parser = argparse.ArgumentParser(description='Run several replications of the simulation model scenarios.')
+    parser.add_argument('scenario_files', nargs='+', help='JSON files with the parameters of the scenarios')
+    parser.add_argument('--replications', type=int, default=20, help='number of replications for each scenario')
+    parser.add_argument('--workers', type=int, default=1, help='number of processes that run the replications')
+    parser.add_argument('--queue-dir', help='directory of a FileQueueExecutor to run the replications in several nodes')
+    parser.add_argument('--seed', type=int, default=40, help='the seed of each replication is seed + replication number')
+    parser.add_argument('--alpha', type=float, default=0.05, help='alpha for the confidence interval')
+    parser.add_argument('--replications-per-task', type=int, default=10, help='replications run by each task')
+    parser.add_argument('--format', dest='output_format', choices=['json', 'csv', 'parquet'], default='json')
+    parser.add_argument('--output', help='output file (by default, the standard output for JSON and CSV)')
+    parser.add_argument(
+        '--log-level', type=str.upper, choices=['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'], default='WARNING',
+        help='logging level (DEBUG shows every simulation event)')
+    arguments = parser.parse_args(argv)
+
+    if arguments.replications < 2:
+        parser.error('at least 2 replications are needed to compute the confidence interval')
+    if arguments.replications_per_task < 1:
+        parser.error('--replications-per-task must be at least 1')
+    if arguments.output_format == 'parquet':
+        if arguments.output is None:
+            parser.error('--output is required for the parquet format')
+        # Parquet needs pyarrow or fastparquet, which are not in requirements.txt. We check it before running
+        # the replications, so we do not lose them
+        if not any(importlib.util.find_spec(engine) for engine in ['pyarrow', 'fastparquet']):
+            parser.error('the parquet format needs pyarrow or fastparquet (pip install pyarrow)')
+
+    # Read and check the scenarios before running anything, so a wrong parameter does not fail in every task
+    # (and in every retry, maybe in other nodes)
+    try:
+        arguments.scenarios = read_scenarios(arguments.scenario_files)
+    except (OSError, ValueError) as error:
+        parser.error(str(error))
+    problems = [
+        problem
+        for scenario_name, parameters in arguments.scenarios.items()
+        for problem in check_scenario(scenario_name, parameters)
+    ]
+    if problems:
+        parser.error('\n'.join(problems))
+    return arguments
+
+
+def main(argv=None):
+    """Runs the scenarios of the command line and writes the results. It also returns them as a table with
+    one row for each scenario and output"""
+
+    arguments = parse_arguments(argv)
+    logging.getLogger().setLevel(arguments.log_level)
+
+    results = run_scenarios(
+        arguments.scenarios,
+        num_replications=arguments.replications,
+        executor=create_executor(arguments.workers, arguments.queue_dir),
+        replications_per_task=arguments.replications_per_task,
+        seed=arguments.seed,
+    )
+
+    df = pd.concat(
+        [
+            results_summary(rows, alpha=arguments.alpha).assign(scenario=scenario_name, replications=len(rows))
+            for scenario_name, rows in results.items()
+        ],
+        ignore_index=True,
+    )
+    df = df[['scenario', 'replications'] + [column for column in df.columns if column not in ('scenario', 'replications')]]
+
+    write_results(df, arguments.output, arguments.output_format)
+    return df
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,191 @@
+import numpy as np
+
+# Number of values drawn from the random generator each time a sampler runs out of values
+BLOCK_SIZE = 1024
+
+# Number of points used for the inverse cumulative distribution lookup array of the empirical distribution
+EMPIRICAL_LOOKUP_SIZE = 1024
+
+# Registry with the distributions that can be used for arrivals, cycle times and batch sizes
+DISTRIBUTIONS = {}
+
+
+def register_distribution(name):
+    """Decorator to add a distribution to the registry. The decorated function receives the parameters of the
+    distribution and returns a function that draws a block of values given a random generator and a size"""
+
+    def decorator(function):
+        DISTRIBUTIONS[name] = function
+        return function
+
+    return decorator
+
+
+@register_distribution('constant')
+def constant(value):
+    """Always returns the same value (the value is never drawn from the random generator)"""
+
+    def draw_block(rng, size):
+        return np.full(size, value)
+
+    return draw_block
+
+
+@register_distribution('uniform')
+def uniform(low, high):
+    """Uniform distribution between low and high"""
+
+    def draw_block(rng, size):
+        return rng.uniform(low, high, size)
+
+    return draw_block
+
+
+@register_distribution('exponential')
+def exponential(mean):
+    """Exponential distribution with the given mean"""
+
+    def draw_block(rng, size):
+        return rng.exponential(mean, size)
+
+    return draw_block
+
+
+@register_distribution('triangular')
+def triangular(low, mode, high):
+    """Triangular distribution between low and high with its peak in mode"""
+
+    def draw_block(rng, size):
+        return rng.triangular(low, mode, high, size)
+
+    return draw_block
+
+
+@register_distribution('lognormal')
+def lognormal(mean, sigma):
+    """Lognormal distribution. mean and sigma are the parameters of the underlying normal distribution"""
+
+    def draw_block(rng, size):
+        return rng.lognormal(mean, sigma, size)
+
+    return draw_block
+
+
+@register_distribution('empirical')
+def empirical(data):
+    """Continuous empirical distribution fitted from a set of observed values.
+    The inverse of the cumulative distribution is precomputed in a lookup array, so each value only needs
+    one uniform random number, one index and one linear interpolation"""
+
+    quantiles = np.quantile(np.asarray(data, dtype=float), np.linspace(0, 1, EMPIRICAL_LOOKUP_SIZE))
+    # Slope between consecutive points of the lookup array
+    steps = np.diff(quantiles, append=quantiles[-1])
+
+    def draw_block(rng, size):
+        position = rng.uniform(0, EMPIRICAL_LOOKUP_SIZE - 1, size)
+        index = position.astype(np.int64)
+        return quantiles[index] + (position - index) * steps[index]
+
+    return draw_block
+
+
+@register_distribution('discrete')
+def discrete(values, probabilities=None):
+    """Discrete distribution over a set of values (for example, batch sizes observed in the MES data).
+    It uses an alias table (Vose's method), so each value only needs one index and one uniform random number"""
+
+    values = np.asarray(values)
+    num_values = len(values)
+    if probabilities is None:
+        probabilities = np.ones(num_values)
+    probabilities = np.asarray(probabilities, dtype=float)
+    probabilities = probabilities / probabilities.sum()
+
+    # Build the alias table
+    scaled = probabilities * num_values
+    prob = np.ones(num_values)
+    alias = np.arange(num_values)
+    small = [i for i in range(num_values) if scaled[i] < 1]
+    large = [i for i in range(num_values) if scaled[i] >= 1]
+    while small and large:
+        s = small.pop()
+        l = large.pop()
+        prob[s] = scaled[s]
+        alias[s] = l
+        scaled[l] = scaled[l] + scaled[s] - 1
+        if scaled[l] < 1:
+            small.append(l)
+        else:
+            large.append(l)
+
+    def draw_block(rng, size):
+        index = rng.integers(0, num_values, size)
+        index = np.where(rng.uniform(0, 1, size) < prob[index], index, alias[index])
+        return values[index]
+
+    return draw_block
+
+
+@register_distribution('bootstrap')
+def bootstrap(data):
+    """Resamples the observed values with replacement"""
+
+    data = np.asarray(data)
+
+    def draw_block(rng, size):
+        return data[rng.integers(0, len(data), size)]
+
+    return draw_block
+
+
+class Sampler(object):
+    """This class draws values from a distribution in blocks and returns them one by one"""
+
+    def __init__(self, draw_block, block_size=BLOCK_SIZE):
+        self.draw_block = draw_block
+        self.block_size = block_size
+        self.rng = np.random.default_rng()
+        self.block = []
+        self.position = 0
+
+    def reset(self, rng):
+        """This method sets the random generator and discards the values drawn with the previous one"""
+        self.rng = rng
+        self.block = []
+        self.position = 0
+
+    def sample(self):
+        """This method returns the next value of the distribution"""
+        if self.position == len(self.block):
+            # tolist() gives Python numbers, which are faster to use one by one than numpy scalars
+            self.block = self.draw_block(self.rng, self.block_size).tolist()
+            self.position = 0
+        value = self.block[self.position]
+        self.position += 1
+        return value
+
+
+def compile_distribution(distribution):
+    """Returns a sampler for a distribution. The distribution can be:
+        * A number, that will be used as a constant.
+        * A dictionary with the 'type' of the distribution (a key of DISTRIBUTIONS) and its parameters,
+          for example {'type': 'uniform', 'low': 1, 'high': 4}.
+        * A sampler, that will be returned as it is."""
+
+    if isinstance(distribution, Sampler):
+        return distribution
+    if isinstance(distribution, dict):
+        parameters = dict(distribution)
+        name = parameters.pop('type')
+        if name not in DISTRIBUTIONS:
+            raise ValueError(f'Unknown distribution {name!r}, the options are {sorted(DISTRIBUTIONS)}')
+        return Sampler(DISTRIBUTIONS[name](**parameters))
+    return Sampler(constant(distribution))
+
+
+def seed_samplers(samplers, seed):
+    """Gives an independent random stream to each sampler. The streams only depend on the seed and the
+    order of the samplers, so the same seed always produces the same values"""
+
+    for sampler, seed_sequence in zip(samplers, np.random.SeedSequence(seed).spawn(len(samplers))):
+        sampler.reset(np.random.default_rng(seed_sequence))
@@ -0,0 +1,335 @@
+"""
+Executors run tasks (for example, one replication of one scenario) and return the results as soon as they are
+ready. All of them have the same method:
+
+    executor.run(function, tasks)
+
+where tasks is a dictionary {task_id: arguments}. The executor calls function(**arguments) for each task and yields
+(task_id, result) in the order in which the tasks finish. A task that fails is run again up to max_retries times.
+
+The seed of a replication only depends on its arguments (see run_replications and SimulationModel.reset in
+simulation_model.py), so a replication gives the same output whatever executor or node runs it.
+"""
+import os
+import sys
+import time
+import uuid
+import pickle
+import argparse
+import threading
+import logging
+import traceback
+import subprocess
+import concurrent.futures
+from concurrent.futures.process import BrokenProcessPool
+
+# Seconds between two touches of the claimed file of a task when the coordinator has no task_timeout
+HEARTBEAT_INTERVAL = 5
+
+
+def run_with_retries(function, task_id, arguments, max_retries):
+    """Runs function(**arguments) and runs it again if it fails, up to max_retries times"""
+
+    for attempt in range(max_retries + 1):
+        try:
+            return function(**arguments)
+        except Exception:
+            if attempt == max_retries:
+                raise
+            logging.warning(f'Task {task_id} failed (attempt {attempt + 1}), retrying\n{traceback.format_exc()}')
+
+
+def set_log_level(level):
+    """Sets the logging level of a worker process. It is called before the worker imports the files of the tasks,
+    so the logging.basicConfig calls of these files do not change it"""
+    logging.basicConfig(level=level)
+    logging.getLogger().setLevel(level)
+
+
+class InProcessExecutor(object):
+    """This class runs the tasks one after another in the current process"""
+
+    def __init__(self, max_retries=2):
+        self.max_retries = max_retries
+
+    def run(self, function, tasks):
+        """This method runs the tasks and yields (task_id, result) as soon as each result is ready"""
+        for task_id, arguments in tasks.items():
+            yield task_id, run_with_retries(function, task_id, arguments, self.max_retries)
+
+
+class LocalProcessExecutor(object):
+    """This class runs the tasks in a pool of processes in the current machine. The processes get the logging level
+    of the current process.
+    When a process dies, the pool does not tell which task it was running, so the failure is counted against the
+    first unfinished task that we see, which may not be the task that killed the process"""
+
+    def __init__(self, num_workers=None, max_retries=2):
+        self.num_workers = num_workers
+        self.max_retries = max_retries
+
+    def create_pool(self):
+        """This method creates the pool of processes"""
+        return concurrent.futures.ProcessPoolExecutor(
+            max_workers=self.num_workers,
+            initializer=set_log_level,
+            initargs=(logging.getLogger().getEffectiveLevel(),),
+        )
+
+    def run(self, function, tasks):
+        """This method runs the tasks and yields (task_id, result) as soon as each result is ready"""
+
+        attempts = {task_id: 0 for task_id in tasks}
+        pool = self.create_pool()
+        try:
+            futures = {pool.submit(function, **arguments): task_id for task_id, arguments in tasks.items()}
+            while futures:
+                done, _ = concurrent.futures.wait(futures, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    task_id = futures.pop(future)
+                    try:
+                        result = future.result()
+                    except BrokenProcessPool:
+                        # A worker process died and the pool can not be used anymore, so we create a new pool
+                        # and submit again all the tasks that have not finished. All of them fail with
+                        # BrokenProcessPool, so we do not know which one killed the process (see the docstring)
+                        attempts[task_id] += 1
+                        if attempts[task_id] > self.max_retries:
+                            raise
+                        logging.warning(f'A process died while task {task_id} or another task was running, creating a new pool')
+                        pool.shutdown(cancel_futures=True)
+                        pool = self.create_pool()
+                        pending = [task_id] + list(futures.values())
+                        futures = {pool.submit(function, **tasks[pending_id]): pending_id for pending_id in pending}
+                        break
+                    except Exception:
+                        attempts[task_id] += 1
+                        if attempts[task_id] > self.max_retries:
+                            raise
+                        logging.warning(f'Task {task_id} failed (attempt {attempts[task_id]}), retrying\n{traceback.format_exc()}')
+                        futures[pool.submit(function, **tasks[task_id])] = task_id
+                    else:
+                        yield task_id, result
+        finally:
+            pool.shutdown(cancel_futures=True)
+
+
+class FileQueueExecutor(object):
+    """
+    This class runs the tasks in workers that can be in several nodes. The tasks and the results are exchanged
+    through files in a directory that all the nodes can read and write (for example, a network file system):
+        * queue_dir/tasks. Tasks waiting for a worker.
+        * queue_dir/claimed. Tasks that a worker is running.
+        * queue_dir/results. Results of the finished tasks.
+        * queue_dir/failed. Errors of the failed tasks.
+    Workers are started in each node with 'python executors.py queue_dir' and keep taking tasks (of any run and
+    any coordinator) until they are stopped. num_local_workers workers are also started in the current machine
+    for each run (useful to test it in localhost), and only these workers are stopped when the run finishes.
+    A local worker that dies is started again.
+    While a worker runs a task, it touches the claimed file four times per task_timeout (the interval goes in the
+    task file). A claimed task whose file has not been touched for task_timeout seconds is queued again (for example,
+    because its worker or its node has died). With task_timeout=None, the task of a dead worker is never queued again.
+    """
+
+    def __init__(self, queue_dir, num_local_workers=0, max_retries=2, task_timeout=60, poll_interval=0.1):
+        if task_timeout is not None and task_timeout <= 0:
+            raise ValueError(f'task_timeout must be positive or None, not {task_timeout}')
+        self.queue_dir = queue_dir
+        self.num_local_workers = num_local_workers
+        self.max_retries = max_retries
+        self.task_timeout = task_timeout
+        self.poll_interval = poll_interval
+
+    def run(self, function, tasks):
+        """This method runs the tasks and yields (task_id, result) as soon as each result is ready"""
+
+        for folder in ['tasks', 'claimed', 'results', 'failed']:
+            os.makedirs(os.path.join(self.queue_dir, folder), exist_ok=True)
+
+        # All the files of this run start with run_id, so several runs (and coordinators) can share the same queue.
+        # Each attempt of a task has its own file name, so a late answer of a previous attempt is ignored
+        run_id = uuid.uuid4().hex
+        pending = {}
+        attempts = {task_id: 0 for task_id in tasks}
+        heartbeat_interval = self.task_timeout / 4 if self.task_timeout is not None else HEARTBEAT_INTERVAL
+
+        def queue_task(task_id):
+            file_name = f'{run_id}-{uuid.uuid4().hex}.pkl'
+            pending[file_name] = task_id
+            write_file(os.path.join(self.queue_dir, 'tasks', file_name), (function, tasks[task_id], heartbeat_interval))
+
+        def retry(file_name, error):
+            task_id = pending.pop(file_name)
+            attempts[task_id] += 1
+            if attempts[task_id] > self.max_retries:
+                raise RuntimeError(f'Task {task_id} failed {attempts[task_id]} times\n{error}')
+            logging.warning(f'Task {task_id} failed (attempt {attempts[task_id]}), retrying\n{error}')
+            queue_task(task_id)
+
+        stop_file = os.path.join(self.queue_dir, f'stop-{run_id}')
+
+        def start_worker():
+            return subprocess.Popen([
+                sys.executable, os.path.abspath(__file__), self.queue_dir,
+                '--log-level', logging.getLevelName(logging.getLogger().getEffectiveLevel()),
+                '--stop-file', stop_file,
+            ])
+
+        workers = []
+        try:
+            for task_id in tasks:
+                queue_task(task_id)
+
+            workers = [start_worker() for _ in range(self.num_local_workers)]
+
+            while pending:
+                found = False
+
+                # Start again the local workers that have died, so the tasks that are queued again can run
+                for worker_number, worker in enumerate(workers):
+                    if worker.poll() is not None:
+                        logging.warning(f'Local worker {worker.pid} died (exit code {worker.returncode}), starting a new one')
+                        workers[worker_number] = start_worker()
+
+                # Results of the finished tasks
+                results_dir = os.path.join(self.queue_dir, 'results')
+                for file_name in os.listdir(results_dir):
+                    if file_name in pending:
+                        found = True
+                        result = read_file(os.path.join(results_dir, file_name))
+                        os.remove(os.path.join(results_dir, file_name))
+                        yield pending.pop(file_name), result
+
+                # Errors of the failed tasks
+                failed_dir = os.path.join(self.queue_dir, 'failed')
+                for file_name in os.listdir(failed_dir):
+                    if file_name in pending:
+                        found = True
+                        error = read_file(os.path.join(failed_dir, file_name))
+                        os.remove(os.path.join(failed_dir, file_name))
+                        retry(file_name, error)
+
+                # Tasks whose worker has not touched the claimed file in time
+                if self.task_timeout is not None:
+                    claimed_dir = os.path.join(self.queue_dir, 'claimed')
+                    for file_name in os.listdir(claimed_dir):
+                        if file_name not in pending:
+                            continue
+                        path = os.path.join(claimed_dir, file_name)
+                        try:
+                            if time.time() - os.path.getmtime(path) <= self.task_timeout:
+                                continue
+                            os.remove(path)
+                        except FileNotFoundError:
+                            # The worker has just finished the task
+                            continue
+                        retry(file_name, f'no answer from the worker after {self.task_timeout} seconds')
+
+                if not found:
+                    time.sleep(self.poll_interval)
+        finally:
+            # Stop the local workers of this run (the other workers keep running)
+            if workers:
+                write_file(stop_file, None)
+                for worker in workers:
+                    worker.wait()
+                os.remove(stop_file)
+
+            # Remove the files of this run that are left in the queue (for example, if a task has failed too
+            # many times), so no worker runs them later
+            for folder in ['tasks', 'claimed', 'results', 'failed']:
+                folder_dir = os.path.join(self.queue_dir, folder)
+                for file_name in os.listdir(folder_dir):
+                    if file_name.startswith(run_id):
+                        try:
+                            os.remove(os.path.join(folder_dir, file_name))
+                        except FileNotFoundError:
+                            pass
+
+
+def write_file(path, content):
+    """Writes a file atomically (first in a temporary file and then renaming it), so a reader never gets
+    a file that is half written"""
+    temporary_path = f'{path}.{uuid.uuid4().hex}.tmp'
+    with open(temporary_path, 'wb') as file:
+        pickle.dump(content, file)
+    os.replace(temporary_path, path)
+
+
+def read_file(path):
+    """Reads a file written with write_file"""
+    with open(path, 'rb') as file:
+        return pickle.load(file)
+
+
+def touch_while_running(path, stop, heartbeat_interval):
+    """Updates the modification time of path every heartbeat_interval seconds until the event stop is set,
+    so the coordinator knows that the worker is alive"""
+    while not stop.wait(heartbeat_interval):
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            # The coordinator has given up on this attempt of the task
+            return
+
+
+def run_worker(queue_dir, stop_file=None, poll_interval=0.1):
+    """Takes tasks from the queue of a FileQueueExecutor and runs them. It runs until it is stopped or, if stop_file
+    is given, until this file exists"""
+
+    tasks_dir = os.path.join(queue_dir, 'tasks')
+    claimed_dir = os.path.join(queue_dir, 'claimed')
+
+    while stop_file is None or not os.path.exists(stop_file):
+        found = False
+        for file_name in sorted(os.listdir(tasks_dir)):
+            if not file_name.endswith('.pkl'):
+                continue
+
+            # Claim the task. Renaming is atomic, so only one worker can get it
+            claimed_path = os.path.join(claimed_dir, file_name)
+            try:
+                os.rename(os.path.join(tasks_dir, file_name), claimed_path)
+                os.utime(claimed_path)
+            except OSError:
+                continue
+            found = True
+
+            stop = threading.Event()
+            heartbeat = None
+            try:
+                # The coordinator tells how often we have to touch the claimed file (it depends on its task_timeout)
+                function, arguments, heartbeat_interval = read_file(claimed_path)
+                heartbeat = threading.Thread(target=touch_while_running, args=(claimed_path, stop, heartbeat_interval))
+                heartbeat.start()
+                answer_dir, answer = 'results', function(**arguments)
+            except Exception:
+                answer_dir, answer = 'failed', traceback.format_exc()
+            finally:
+                stop.set()
+                if heartbeat is not None:
+                    heartbeat.join()
+
+            # Only answer if the coordinator is still waiting for this attempt of the task
+            try:
+                os.remove(claimed_path)
+            except FileNotFoundError:
+                continue
+            write_file(os.path.join(queue_dir, answer_dir, file_name), answer)
+
+            if stop_file is not None and os.path.exists(stop_file):
+                return
+
+        if not found:
+            time.sleep(poll_interval)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Worker of a FileQueueExecutor.')
+    parser.add_argument('queue_dir', help='directory of the queue')
+    parser.add_argument('--log-level', help='logging level of the worker')
+    parser.add_argument('--stop-file', help='the worker stops when this file exists (by default, it never stops)')
+    arguments = parser.parse_args()
+    if arguments.log_level is not None:
+        set_log_level(arguments.log_level)
+    run_worker(arguments.queue_dir, stop_file=arguments.stop_file)
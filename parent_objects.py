@@ -1,6 +1,13 @@
 import simpy
 import random
 import logging
+import numbers
+from collections import deque
+from simpy.core import BoundClass
+from simpy.resources.base import BaseResource
+from simpy.resources.store import StorePut, StoreGet
+
+from distributions import compile_distribution
 
 logging.basicConfig(level=logging.DEBUG)
 
@@ -8,50 +15,242 @@ logging.basicConfig(level=logging.DEBUG)
 class Part(object):
     """This class represents the entities or parts."""
 
-    def __init__(self, env, name, arrival_time_lower_boundary, arrival_time_upper_boundary, batch_size, input_buffer):
-        self.env = env
+    def __init__(self, env, name, inter_arrival_time, batch_size, input_buffer):
         self.name = name
-        self.arrival_time_lower_boundary = arrival_time_lower_boundary
-        self.arrival_time_upper_boundary = arrival_time_upper_boundary
-        self.batch_size = batch_size
+        self.inter_arrival_time = compile_distribution(inter_arrival_time)
+        self.batch_size = compile_distribution(batch_size)
         self.input_buffer = input_buffer
+        self.reset(env)
+
+    def reset(self, env):
+        """This method moves the part to a new environment to run another replication"""
+        self.env = env
 
     def generate_arrivals(self):
         """This method generates the part arrivals and puts them in the correct input buffer"""
 
         while True:
-            # Generate the inter arrival time using a uniform distribution and wait until the next arrival
-            yield self.env.timeout(random.uniform(self.arrival_time_lower_boundary, self.arrival_time_upper_boundary))
-            logging.debug(f'{self.env.now:.2f} {self.name} has arrived with batch_size={self.batch_size}')
+            # Generate the inter arrival time and wait until the next arrival
+            yield self.env.timeout(self.inter_arrival_time.sample())
+            batch_size = int(self.batch_size.sample())
+            logging.debug(f'{self.env.now:.2f} {self.name} has arrived with batch_size={batch_size}')
 
             # More than one part can arrive at the same time
-            for num_parts in range(self.batch_size):
-                # Put the part in the correct buffer
-                yield self.input_buffer.put(self.name)
+            parts_to_put = batch_size
+            while parts_to_put > 0:
+                # Put the parts in the correct buffer. The buffer tells us how many parts have entered
+                # (all the parts that fit in a CountingStore, one part in a Store)
+                num_parts = yield self.input_buffer.put_many(self.name, parts_to_put)
+                parts_to_put -= num_parts
                 logging.debug(
-                    f'{self.env.now:.2f} {self.name} in {self.input_buffer.name}, items={len(self.input_buffer.store.items)} and capacity={self.input_buffer.store.capacity}')
+                    f'{self.env.now:.2f} {num_parts} {self.name} in {self.input_buffer.name}, items={self.input_buffer.level} and capacity={self.input_buffer.capacity}')
 
                 # Update the number of parts that comes in the input buffer
-                self.input_buffer.total_parts_in += 1
+                self.input_buffer.total_parts_in += num_parts
+
+
+class PartsStore(simpy.Store):
+    """This class is a simpy.Store whose put requests have the number of parts that have entered as value (always one),
+    like CountingResource. When several parts leave at once, it lets in all the parts that were waiting.
+
+    It uses private simpy API (checked with simpy 4.1.1 and 4.1.2), like CountingResource and Store.take:
+        * _capacity is the capacity given to the constructor.
+        * _trigger_put(get_event) calls _do_put for the waiting put requests in order, removes the ones that have
+          succeeded, and stops when _do_put returns a false value. take calls it with None after removing the parts.
+    """
+
+    def _do_put(self, event):
+        if len(self.items) < self._capacity:
+            self.items.append(event.item)
+            event.succeed(1)
+            return True
+        return False
 
 
 class Store(object):
     """This class represents the place where the parts will be stored"""
 
     def __init__(self, env, name, capacity):
-        self.env = env
         self.name = name
-        self.store = simpy.Store(env, capacity=capacity)
+        self.capacity = capacity
+        # Functions called each time a part enters the buffer (for example, by a machine that waits for parts)
+        self.put_listeners = []
+        self.reset(env)
+
+    def reset(self, env):
+        """This method empties the buffer and moves it to a new environment to run another replication"""
+        self.env = env
+        self.store = self.create_store(env)
         self.total_parts_in = 0
         self.total_parts_out = 0
 
+    def create_store(self, env):
+        """This method creates the simpy object that keeps the parts"""
+        return PartsStore(env, capacity=self.capacity)
+
+    @property
+    def level(self):
+        """Number of parts in the buffer"""
+        return len(self.store.items)
+
     def get(self):
         """This method is used to get a part from a buffer"""
         return self.store.get()
 
+    def take(self, quantity):
+        """This method is used to take several parts from a buffer at once, without waiting (and without events).
+        The buffer must have at least quantity parts"""
+        parts = self.store.items[:quantity]
+        del self.store.items[:quantity]
+        # Let in the parts that were waiting for space in the buffer (simpy private API, see PartsStore)
+        self.store._trigger_put(None)
+        return parts
+
     def put(self, part):
         """This method is used to put a part in a buffer"""
-        return self.store.put(part)
+        event = self.store.put(part)
+        if self.put_listeners:
+            event.callbacks.append(self.notify_put_listeners)
+        return event
+
+    def put_many(self, part, quantity):
+        """This method is used to put several parts of the same type in a buffer. The value of the event is the number
+        of parts that have entered, so we have to put the rest again. This buffer puts the parts one by one"""
+        return self.put(part)
+
+    def add_put_listener(self, listener):
+        """This method registers a function that is called each time a part enters the buffer"""
+        self.put_listeners.append(listener)
+
+    def notify_put_listeners(self, event=None):
+        """This method calls the functions registered with add_put_listener"""
+        for listener in self.put_listeners:
+            listener()
+
+
+class CountingPut(StorePut):
+    """Request to put a part in a CountingResource"""
+
+    # Number of parts of the request
+    quantity = 1
+
+
+class CountingPutMany(StorePut):
+    """Request to put quantity parts of the same type in a CountingResource"""
+
+    def __init__(self, resource, part, quantity):
+        self.quantity = quantity
+        super().__init__(resource, part)
+
+
+class CountingResource(BaseResource):
+    """This class is a simpy resource like simpy.Store, but it only keeps the number of parts of each type
+    (and their order if keep_order is True) instead of a list with all the parts.
+    It uses the same private simpy API as PartsStore"""
+
+    put = BoundClass(CountingPut)
+    get = BoundClass(StoreGet)
+
+    def __init__(self, env, capacity, keep_order=False):
+        super().__init__(env, capacity)
+        self.level = 0
+        # Number of parts of each type
+        self.counts = {}
+        # Types of the parts in arrival order (only if keep_order is True)
+        self.order = deque() if keep_order else None
+
+    def put_many(self, part, quantity):
+        """Request to put quantity parts of the same type with a single event"""
+        return CountingPutMany(self, part, quantity)
+
+    def _do_put(self, event):
+        # A put_many request puts all the parts that fit in the buffer, and its value is the number of parts
+        quantity = min(event.quantity, self._capacity - self.level)
+        if quantity > 0:
+            part = event.item
+            self.level += quantity
+            self.counts[part] = self.counts.get(part, 0) + quantity
+            if self.order is not None:
+                self.order.extend([part] * quantity)
+            event.succeed(quantity)
+        # Go on with the next request waiting in the queue only if this one has entered
+        return quantity > 0
+
+    def _do_get(self, event):
+        if self.level > 0:
+            event.succeed(self._take_part())
+        return None
+
+    def take(self, quantity):
+        """Takes quantity parts at once (the first ones, or any parts if the order is not kept)"""
+        if self.order is not None:
+            parts = [self.order.popleft() for _ in range(quantity)]
+            for part in parts:
+                self.counts[part] -= 1
+                if self.counts[part] == 0:
+                    del self.counts[part]
+        else:
+            parts = []
+            for part in list(self.counts):
+                taken = min(self.counts[part], quantity - len(parts))
+                parts.extend([part] * taken)
+                self.counts[part] -= taken
+                if self.counts[part] == 0:
+                    del self.counts[part]
+                if len(parts) == quantity:
+                    break
+        self.level -= quantity
+        # Let in the parts that were waiting for space in the buffer
+        self._trigger_put(None)
+        return parts
+
+    def _take_part(self):
+        """Takes the first part (or any part if the order is not kept) and updates the counters"""
+        if self.order is not None:
+            part = self.order.popleft()
+        else:
+            part = next(iter(self.counts))
+        self.counts[part] -= 1
+        if self.counts[part] == 0:
+            del self.counts[part]
+        self.level -= 1
+        return part
+
+
+class CountingStore(Store):
+    """
+    This class represents the place where the parts will be stored, like Store, but it only keeps the number of parts
+    of each type instead of a list with all the parts, so it uses less memory when the buffer has a lot of parts.
+    All the parts of a batch that fit in the buffer enter with a single event (put_many), and the machines take
+    several parts at once without events (take).
+    If keep_order is True, it also keeps the order of arrival of the parts (FIFO).
+    """
+
+    def __init__(self, env, name, capacity, keep_order=False):
+        self.keep_order = keep_order
+        super().__init__(env, name, capacity)
+
+    def create_store(self, env):
+        """This method creates the simpy object that keeps the parts"""
+        return CountingResource(env, capacity=self.capacity, keep_order=self.keep_order)
+
+    @property
+    def level(self):
+        """Number of parts in the buffer"""
+        return self.store.level
+
+    def take(self, quantity):
+        """This method is used to take several parts from a buffer at once, without waiting (and without events).
+        The buffer must have at least quantity parts"""
+        return self.store.take(quantity)
+
+    def put_many(self, part, quantity):
+        """This method is used to put several parts of the same type in a buffer. All the parts that fit in the buffer
+        enter with a single event, whose value is the number of parts that have entered"""
+        event = self.store.put_many(part, quantity)
+        if self.put_listeners:
+            event.callbacks.append(self.notify_put_listeners)
+        return event
 
 
 class MachineCheckQuality(object):
@@ -61,19 +260,27 @@ class MachineCheckQuality(object):
     Parts with defects will be stored in a special buffer to be repaired by another machine.
     """
     def __init__(self, env, name, input_buffer, cycle_time, failure_rate, output_buffer_ok, output_buffer_ko):
-        self.env = env
         self.name = name
         self.input_buffer = input_buffer
-        self.cycle_time = cycle_time
+        self.cycle_time = compile_distribution(cycle_time)
         self.failure_rate = failure_rate
         self.output_buffer_ok = output_buffer_ok
         self.output_buffer_ko = output_buffer_ko
+        self.reset(env)
+
+    def reset(self, env):
+        """This method clears the statistics and moves the machine to a new environment to run another replication"""
+        self.env = env
         self.total_waiting_time = 0
         self.total_working_time = 0
         self.total_blocking_time = 0
         self.total_parts_in = 0
         self.total_parts_out = 0
 
+    def parts_in_now(self):
+        """This method returns the number of parts that are in the machine"""
+        return self.total_parts_in - self.total_parts_out
+
     def check_quality(self):
         """This method takes a part from an input buffer, reviews its quality and put it in an output buffer if
         it has a defect or in another if it does not have any defect"""
@@ -94,7 +301,7 @@ class MachineCheckQuality(object):
 
             # Working time
             start = self.env.now
-            yield self.env.timeout(self.cycle_time)
+            yield self.env.timeout(self.cycle_time.sample())
             end = self.env.now
             self.total_working_time += end - start
 
@@ -104,7 +311,7 @@ class MachineCheckQuality(object):
                 logging.debug(f'{self.env.now:.2f} Machine {self.name} detects a defect')
 
                 yield self.output_buffer_ko.put(part)
-                logging.debug(f'{self.env.now:.2f} Machine {self.name} put the part in {self.output_buffer_ko.name}, items={len(self.output_buffer_ko.store.items)} amd capacity={self.output_buffer_ko.store.capacity}')
+                logging.debug(f'{self.env.now:.2f} Machine {self.name} put the part in {self.output_buffer_ko.name}, items={self.output_buffer_ko.level} amd capacity={self.output_buffer_ko.capacity}')
 
                 # Update the number of parts with a defect in the output buffer
                 self.output_buffer_ko.total_parts_in += 1
@@ -116,7 +323,7 @@ class MachineCheckQuality(object):
                 logging.debug(f'{self.env.now:.2f} Machine {self.name} does not detect a defect')
 
                 yield self.output_buffer_ok.put(part)
-                logging.debug(f'{self.env.now:.2f} Machine {self.name} puts the part in {self.output_buffer_ok.name}, items={len(self.output_buffer_ok.store.items)} and capacity={self.output_buffer_ok.store.capacity}')
+                logging.debug(f'{self.env.now:.2f} Machine {self.name} puts the part in {self.output_buffer_ok.name}, items={self.output_buffer_ok.level} and capacity={self.output_buffer_ok.capacity}')
 
                 # Update the number of parts without a defect in the output buffer
                 self.output_buffer_ok.total_parts_in += 1
@@ -131,17 +338,25 @@ class MachineCheckQuality(object):
 class MachineRepairPart(object):
     """This class represents the machine where somebody will repair the parts that have a defect."""
     def __init__(self, env, name, input_buffer, cycle_time, output_buffer):
-        self.env = env
         self.name = name
         self.input_buffer = input_buffer
-        self.cycle_time = cycle_time
+        self.cycle_time = compile_distribution(cycle_time)
         self.output_buffer = output_buffer
+        self.reset(env)
+
+    def reset(self, env):
+        """This method clears the statistics and moves the machine to a new environment to run another replication"""
+        self.env = env
         self.total_waiting_time = 0
         self.total_working_time = 0
         self.total_blocking_time = 0
         self.total_parts_in = 0
         self.total_parts_out = 0
 
+    def parts_in_now(self):
+        """This method returns the number of parts that are in the machine"""
+        return self.total_parts_in - self.total_parts_out
+
     def repair_part(self):
         """This method takes a part from an input buffer, repairs it and puts it an output buffer"""
         while True:
@@ -161,14 +376,14 @@ class MachineRepairPart(object):
 
             # Working time
             start = self.env.now
-            yield self.env.timeout(self.cycle_time)
+            yield self.env.timeout(self.cycle_time.sample())
             end = self.env.now
             self.total_working_time += end - start
 
             # Blocking time
             start = self.env.now
             yield self.output_buffer.put(part)
-            logging.debug(f'{self.env.now:.2f} Machine {self.name} puts the part in {self.output_buffer.name}, items={len(self.output_buffer.store.items)} and capacity={self.output_buffer.store.capacity}')
+            logging.debug(f'{self.env.now:.2f} Machine {self.name} puts the part in {self.output_buffer.name}, items={self.output_buffer.level} and capacity={self.output_buffer.capacity}')
             end = self.env.now
             self.total_blocking_time += end - start
 
@@ -179,42 +394,76 @@ class MachineRepairPart(object):
             self.output_buffer.total_parts_in += 1
 
 
-class MachineCreateFinalProducts(object):
-    """This class represents the machine where somebody will join two different raw parts
-    to create a final product"""
-    def __init__(self, env, name, input_buffer1, input_buffer2, cycle_time, output_buffer):
-        self.env = env
+class MachineAssembly(object):
+    """
+    This class represents the machine where somebody will join several raw parts to create a final product.
+    The bill of materials is a list of (input_buffer, quantity), for example [(buffer_A, 2), (buffer_B, 1)]
+    means that each final product needs two parts from buffer_A and one part from buffer_B.
+    """
+    def __init__(self, env, name, bill_of_materials, cycle_time, output_buffer, product_name='final'):
         self.name = name
-        self.input_buffer1 = input_buffer1
-        self.input_buffer2 = input_buffer2
-        self.cycle_time = cycle_time
+        self.bill_of_materials = bill_of_materials
+        self.cycle_time = compile_distribution(cycle_time)
         self.output_buffer = output_buffer
+        self.product_name = product_name
+        # Number of raw parts in each final product
+        self.parts_per_product = sum(quantity for input_buffer, quantity in bill_of_materials)
+        for input_buffer, quantity in bill_of_materials:
+            # The machine takes the parts with slices, so a quantity like 2.0 (for example, from a JSON file) fails
+            if not isinstance(quantity, numbers.Integral):
+                raise TypeError(f'Machine {name} needs an integer quantity of parts from {input_buffer.name}, not {quantity!r}')
+            # Otherwise the machine would wait forever
+            if not 1 <= quantity <= input_buffer.capacity:
+                raise ValueError(
+                    f'Machine {name} needs {quantity} parts from {input_buffer.name}, '
+                    f'but its capacity is {input_buffer.capacity}')
+            # Each time a part enters an input buffer, the machine checks if it can get the parts that it needs
+            input_buffer.add_put_listener(self.try_to_get_parts)
+        self.reset(env)
+
+    def reset(self, env):
+        """This method clears the statistics and moves the machine to a new environment to run another replication"""
+        self.env = env
         self.total_waiting_time = 0
         self.total_working_time = 0
         self.total_blocking_time = 0
         self.total_parts_in = 0
         self.total_parts_out = 0
-
-    def create_final_products(self):
-        """This method takes a part from an input buffer and another part from another input buffer and joins then to
+        # Event that succeeds with the parts of the bill of materials when the machine gets them
+        self.parts_request = None
+
+    def parts_in_now(self):
+        """This method returns the number of raw parts that are in the machine"""
+        return self.total_parts_in - self.total_parts_out * self.parts_per_product
+
+    def try_to_get_parts(self):
+        """This method takes the parts of the bill of materials from all the input buffers at once if the machine
+        is waiting for them and all the buffers have them"""
+        if self.parts_request is None:
+            return
+        for input_buffer, quantity in self.bill_of_materials:
+            if input_buffer.level < quantity:
+                return
+        parts = [part for input_buffer, quantity in self.bill_of_materials for part in input_buffer.take(quantity)]
+        parts_request, self.parts_request = self.parts_request, None
+        parts_request.succeed(parts)
+
+    def assemble(self):
+        """This method takes the parts of the bill of materials from the input buffers and joins them to
         create a final product that put it in an output buffer"""
         while True:
-            # Get parts from the input buffers
+            # Get all the parts of the bill of materials at once. There is a single event, that succeeds when all
+            # the input buffers have the parts (try_to_get_parts is called again each time a part enters them)
             start = self.env.now
-
-            part1 = yield self.input_buffer1.get()
-            logging.debug(f'{self.env.now:.2f} Machine {self.name} gets a part from {self.input_buffer1.name}')
+            parts_request = self.parts_request = self.env.event()
+            self.try_to_get_parts()
+            yield parts_request
+            for input_buffer, quantity in self.bill_of_materials:
+                logging.debug(f'{self.env.now:.2f} Machine {self.name} gets {quantity} parts from {input_buffer.name}')
+                # Update the number of parts out the input buffer
+                input_buffer.total_parts_out += quantity
             # Update the number of parts in the machine
-            self.total_parts_in += 1
-            # Update the number of parts out the input buffer1
-            self.input_buffer1.total_parts_out += 1
-
-            part2 = yield self.input_buffer2.get()
-            logging.debug(f'{self.env.now:.2f} Machine {self.name} gets a part from {self.input_buffer2.name}')
-            # Update the number of parts in the machine
-            self.total_parts_in += 1
-            # Update the number of parts out the input buffer2
-            self.input_buffer2.total_parts_out += 1
+            self.total_parts_in += self.parts_per_product
 
             end = self.env.now
             # Update the time that the machine have to wait for a part
@@ -222,15 +471,14 @@ class MachineCreateFinalProducts(object):
 
             # Working time
             start = self.env.now
-            yield self.env.timeout(self.cycle_time)
+            yield self.env.timeout(self.cycle_time.sample())
             end = self.env.now
             self.total_working_time += end - start
 
             # Blocking time
             start = self.env.now
-            yield self.output_buffer.put(part1)
-            yield self.output_buffer.put(part2)
-            logging.debug(f'{self.env.now:.2f} Machine {self.name} puts final product in {self.output_buffer.name}, items={len(self.output_buffer.store.items)/2} and capacity={self.output_buffer.store.capacity}')
+            yield self.output_buffer.put(self.product_name)
+            logging.debug(f'{self.env.now:.2f} Machine {self.name} puts final product in {self.output_buffer.name}, items={self.output_buffer.level} and capacity={self.output_buffer.capacity}')
             end = self.env.now
             self.total_blocking_time += end - start
 
@@ -239,3 +487,15 @@ class MachineCreateFinalProducts(object):
 
             # Update the number of parts in the output buffer
             self.output_buffer.total_parts_in += 1
+
+
+class MachineCreateFinalProducts(MachineAssembly):
+    """This class represents the machine where somebody will join two different raw parts
+    to create a final product"""
+    def __init__(self, env, name, input_buffer1, input_buffer2, cycle_time, output_buffer):
+        super().__init__(env, name, [(input_buffer1, 1), (input_buffer2, 1)], cycle_time, output_buffer)
+
+    def create_final_products(self):
+        """This method takes a part from an input buffer and another part from another input buffer and joins then to
+        create a final product that put it in an output buffer"""
+        return self.assemble()
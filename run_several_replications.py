@@ -1,9 +1,37 @@
 # Import from libraries
-import pandas as pd
+import numpy as np
 
 # Import from files
-from run_one_replication import run_one_replication
+from simulation_model import run_replications, results_to_dataframes, NUM_RESULTS
 from tools import confidence_interval
+from executors import InProcessExecutor
+
+
+def run_scenarios(scenarios, num_replications, executor=None, replications_per_task=10, seed=40):
+    """This function runs several replications of several scenarios. scenarios is a dictionary
+    {scenario_name: parameters}, where parameters are the arguments of SimulationModel and simulation_time.
+    As result, we get a dictionary {scenario_name: array with one row for each replication} (see RESULT_NAMES).
+
+    The replications of all the scenarios are run by the executor (see executors.py), in the current process
+    by default. Each task creates the simulation model once and runs replications_per_task replications with it.
+    The seed of each replication is seed + replication number, whatever executor runs it."""
+
+    if executor is None:
+        executor = InProcessExecutor()
+
+    # One task for each group of replications of each scenario
+    tasks = {}
+    for scenario_name, parameters in scenarios.items():
+        for first_replication in range(0, num_replications, replications_per_task):
+            replication_numbers = list(range(first_replication, min(first_replication + replications_per_task, num_replications)))
+            tasks[(scenario_name, first_replication)] = dict(replication_numbers=replication_numbers, seed=seed, **parameters)
+
+    # Add the results of each group of replications as soon as it finishes
+    results = {scenario_name: np.zeros((num_replications, NUM_RESULTS)) for scenario_name in scenarios}
+    for (scenario_name, first_replication), rows in executor.run(run_replications, tasks):
+        results[scenario_name][tasks[(scenario_name, first_replication)]['replication_numbers']] = rows
+
+    return results
 
 
 def run_several_replications(
@@ -24,48 +52,57 @@ def run_several_replications(
         machine_repair_partB_cycle_time,
         machine_create_final_products_cycle_time,
         failure_rate_partB,
-        simulation_time
+        simulation_time,
+        partA_arrival_distribution=None,
+        partB_arrival_distribution=None,
+        final_product_partA_quantity=1,
+        final_product_partB_quantity=1,
+        counting_buffers=False,
+        counting_buffers_keep_order=False,
+        executor=None,
+        replications_per_task=10
 ):
     """This function includes all we need to run several replications of the simulation model.
     As result, we get information about the main output for parts, buffers and machines
-    (mean and confidence interval for the mean for eah output)"""
-
-    df_parts_statistics = pd.DataFrame()
-    df_buffers_statistics = pd.DataFrame()
-    df_machines_statistics = pd.DataFrame()
-
-    for replication_number in range(num_replications):
-
-        df_parts_statistics_aux, df_buffers_statistics_aux, df_machines_statistics_aux = run_one_replication(
-            replication_number,
-            partA_arrival_distribution_lower_boundary,
-            partA_arrival_distribution_upper_boundary,
-            partB_arrival_distribution_lower_boundary,
-            partB_arrival_distribution_upper_boundary,
-            partA_batch_size,
-            partB_batch_size,
-            buffer_partA_ok_capacity,
-            buffer_partB_review_capacity,
-            buffer_partB_ok_capacity,
-            buffer_partB_ko_capacity,
-            buffer_final_products_capacity,
-            machine_check_quality_partB_cycle_time,
-            machine_repair_partB_cycle_time,
-            machine_create_final_products_cycle_time,
-            failure_rate_partB,
-            simulation_time
-        )
-
-        df_parts_statistics = pd.concat([df_parts_statistics, df_parts_statistics_aux])
-        df_buffers_statistics = pd.concat([df_buffers_statistics, df_buffers_statistics_aux])
-        df_machines_statistics = pd.concat([df_machines_statistics, df_machines_statistics_aux])
+    (mean and confidence interval for the mean for eah output).
+
+    The replications are run by the executor (see executors.py), in the current process by default.
+    Each task creates the simulation model once and runs replications_per_task replications with it."""
+
+    parameters = dict(
+        partA_arrival_distribution_lower_boundary=partA_arrival_distribution_lower_boundary,
+        partA_arrival_distribution_upper_boundary=partA_arrival_distribution_upper_boundary,
+        partB_arrival_distribution_lower_boundary=partB_arrival_distribution_lower_boundary,
+        partB_arrival_distribution_upper_boundary=partB_arrival_distribution_upper_boundary,
+        partA_batch_size=partA_batch_size,
+        partB_batch_size=partB_batch_size,
+        buffer_partA_ok_capacity=buffer_partA_ok_capacity,
+        buffer_partB_review_capacity=buffer_partB_review_capacity,
+        buffer_partB_ok_capacity=buffer_partB_ok_capacity,
+        buffer_partB_ko_capacity=buffer_partB_ko_capacity,
+        buffer_final_products_capacity=buffer_final_products_capacity,
+        machine_check_quality_partB_cycle_time=machine_check_quality_partB_cycle_time,
+        machine_repair_partB_cycle_time=machine_repair_partB_cycle_time,
+        machine_create_final_products_cycle_time=machine_create_final_products_cycle_time,
+        failure_rate_partB=failure_rate_partB,
+        simulation_time=simulation_time,
+        partA_arrival_distribution=partA_arrival_distribution,
+        partB_arrival_distribution=partB_arrival_distribution,
+        final_product_partA_quantity=final_product_partA_quantity,
+        final_product_partB_quantity=final_product_partB_quantity,
+        counting_buffers=counting_buffers,
+        counting_buffers_keep_order=counting_buffers_keep_order,
+    )
+    rows = run_scenarios({'scenario': parameters}, num_replications, executor, replications_per_task)['scenario']
+
+    df_parts_statistics, df_buffers_statistics, df_machines_statistics = results_to_dataframes(rows)
 
     print("\n")
     print("Part main statistics")
 
     print(
         df_parts_statistics.groupby('statistics').agg(
-            lambda x: confidence_interval(values=x, alpha=alpha, num_replications=replication_number)
+            lambda x: confidence_interval(values=x, alpha=alpha, num_replications=num_replications)
         ).reset_index()
     )
 
@@ -74,7 +111,7 @@ def run_several_replications(
 
     print(
         df_buffers_statistics.groupby('statistics').agg(
-            lambda x: confidence_interval(values=x, alpha=alpha, num_replications=replication_number)
+            lambda x: confidence_interval(values=x, alpha=alpha, num_replications=num_replications)
         ).reset_index()
     )
 
@@ -83,6 +120,6 @@ def run_several_replications(
 
     print(
         df_machines_statistics.groupby('statistics').agg(
-            lambda x: confidence_interval(values=x, alpha=alpha, num_replications=replication_number)
+            lambda x: confidence_interval(values=x, alpha=alpha, num_replications=num_replications)
         ).reset_index()
     )
@@ -0,0 +1,278 @@
+"""
+Design of experiments and sensitivity analysis over the parameters of the simulation model.
+
+Instead of running one-at-a-time scenarios, we:
+    1. Create a design (Latin hypercube or two level fractional factorial) over the factors that we want to study.
+    2. Run several replications of each point of the design in parallel (see executors.py).
+    3. Fit a fast surrogate (metamodel) of the simulation output: polynomial regression or a Gaussian process.
+    4. Compute Sobol and Morris sensitivity indices with the surrogate.
+After that, the surrogate gives instant what-if answers with surrogate.predict(...).
+
+The factors are a dictionary {parameter: (low, high)} with parameters of SimulationModel, for example
+{'buffer_partB_ko_capacity': (1, 5), 'failure_rate_partB': (0.2, 0.6)}. If both boundaries are integers,
+the values of the factor are rounded (batch sizes, capacities...).
+
+    factors = {...}
+    design = scale_design(latin_hypercube(50, len(factors), seed=1), factors)
+    responses = run_design(design, base_parameters, num_replications=10, executor=LocalProcessExecutor(4))
+    surrogate = PolynomialSurrogate(factors).fit(design, responses)
+    print(sobol_indices(surrogate, factors))
+    print(morris_indices(surrogate, factors))
+"""
+# Import from libraries
+import numpy as np
+import pandas as pd
+from itertools import combinations, combinations_with_replacement
+from scipy.optimize import minimize
+from scipy.stats import qmc
+
+# Import from files
+from run_several_replications import run_scenarios
+from simulation_model import RESULT_NAMES
+
+# Output used by default as response: number of final products created
+FINALS_THROUGHPUT = ('parts', '3_total_created', 'finals')
+
+
+def latin_hypercube(num_points, num_factors, seed=None):
+    """Returns a Latin hypercube design with num_points points in the unit hypercube"""
+    return qmc.LatinHypercube(d=num_factors, seed=seed).random(num_points)
+
+
+def fractional_factorial(num_factors):
+    """Returns a two level fractional factorial design in the unit hypercube (levels 0 and 1).
+    It is a full factorial design over the smallest number of base factors, and each other factor takes the
+    levels of an interaction of the base factors (the highest order interactions first).
+    Main effects are not confounded between them (resolution III or higher)"""
+
+    # Smallest number of base factors whose interactions give a column for each factor
+    num_base_factors = 1
+    while 2 ** num_base_factors - 1 < num_factors:
+        num_base_factors += 1
+
+    # Full factorial design over the base factors with levels -1 and 1
+    base = np.array(np.meshgrid(*[[-1, 1]] * num_base_factors, indexing='ij')).reshape(num_base_factors, -1).T
+
+    columns = [base[:, i] for i in range(num_base_factors)]
+    for order in range(num_base_factors, 1, -1):
+        for interaction in combinations(range(num_base_factors), order):
+            if len(columns) == num_factors:
+                break
+            columns.append(np.prod(base[:, list(interaction)], axis=1))
+
+    return (np.column_stack(columns[:num_factors]) + 1) / 2
+
+
+def scale_design(unit_design, factors):
+    """Returns the points of a design in the unit hypercube as a list of {parameter: value}"""
+
+    design = []
+    for unit_point in np.atleast_2d(unit_design):
+        point = {}
+        for value, (parameter, (low, high)) in zip(unit_point, factors.items()):
+            value = low + value * (high - low)
+            if isinstance(low, int) and isinstance(high, int):
+                value = int(round(value))
+            point[parameter] = value
+        design.append(point)
+    return design
+
+
+def run_design(design, base_parameters, num_replications, executor=None, output=FINALS_THROUGHPUT, seed=40):
+    """Runs num_replications replications of each point of the design and returns the mean of the output for each
+    point. base_parameters has the parameters of SimulationModel and simulation_time that are not factors"""
+
+    scenarios = {point_number: {**base_parameters, **point} for point_number, point in enumerate(design)}
+    results = run_scenarios(scenarios, num_replications, executor=executor, seed=seed)
+    column = RESULT_NAMES.index(output)
+    return np.array([results[point_number][:, column].mean() for point_number in range(len(design))])
+
+
+def design_to_array(design, factors):
+    """Returns the points of a design (a list of {parameter: value}) as an array with one column for each factor"""
+    return np.array([[point[parameter] for parameter in factors] for point in design], dtype=float)
+
+
+class PolynomialSurrogate(object):
+    """This class represents a polynomial regression of the simulation output over the factors.
+    With degree=2 it includes the squares of the factors and the interactions between pairs of factors, so the design
+    needs more points than terms (1 + 2 * factors + factors * (factors - 1) / 2). Use degree=1 with factorial designs"""
+
+    def __init__(self, factors, degree=2):
+        self.factors = factors
+        self.degree = degree
+        self.low = np.array([low for low, high in factors.values()], dtype=float)
+        self.high = np.array([high for low, high in factors.values()], dtype=float)
+        self.coefficients = None
+
+    def features(self, x):
+        """This method returns the terms of the polynomial for the points x (one row for each point)"""
+        # Factors scaled to [-1, 1] so all the coefficients are comparable
+        x = 2 * (x - self.low) / (self.high - self.low) - 1
+        terms = [np.ones(len(x))]
+        for degree in range(1, self.degree + 1):
+            for combination in combinations_with_replacement(range(x.shape[1]), degree):
+                terms.append(np.prod(x[:, list(combination)], axis=1))
+        return np.column_stack(terms)
+
+    def fit(self, design, responses):
+        """This method fits the polynomial to the responses of the points of the design"""
+        x = design_to_array(design, self.factors) if not isinstance(design, np.ndarray) else design
+        self.coefficients = np.linalg.lstsq(self.features(x), np.asarray(responses, dtype=float), rcond=None)[0]
+        return self
+
+    def predict(self, x):
+        """This method returns the predicted output for the points x (an array with one column for each factor
+        or a list of {parameter: value})"""
+        x = design_to_array(x, self.factors) if not isinstance(x, np.ndarray) else np.atleast_2d(x)
+        return self.features(x) @ self.coefficients
+
+
+class GaussianProcessSurrogate(object):
+    """This class represents a Gaussian process regression of the simulation output over the factors, with a
+    squared exponential kernel (one length scale for each factor) and a noise term for the replication noise.
+    The hyperparameters are fitted maximizing the marginal likelihood"""
+
+    def __init__(self, factors):
+        self.factors = factors
+        self.low = np.array([low for low, high in factors.values()], dtype=float)
+        self.high = np.array([high for low, high in factors.values()], dtype=float)
+
+    def scale(self, x):
+        """This method scales the factors to [0, 1]"""
+        return (x - self.low) / (self.high - self.low)
+
+    def kernel(self, x1, x2, length_scales, signal_variance):
+        """This method returns the covariance between the points x1 and x2"""
+        # Squared distances as |x1|^2 + |x2|^2 - 2 x1 x2, so we do not need an array with all the differences
+        # (it would be too big with the number of points used by sobol_indices)
+        x1 = x1 / length_scales
+        x2 = x2 / length_scales
+        distances = (x1 ** 2).sum(axis=1)[:, None] + (x2 ** 2).sum(axis=1)[None, :] - 2 * x1 @ x2.T
+        return signal_variance * np.exp(-0.5 * np.maximum(distances, 0))
+
+    def negative_log_likelihood(self, log_hyperparameters, x, y):
+        """This method returns the negative log marginal likelihood of the hyperparameters"""
+        length_scales = np.exp(log_hyperparameters[:-2])
+        signal_variance, noise_variance = np.exp(log_hyperparameters[-2:])
+        covariance = self.kernel(x, x, length_scales, signal_variance) + (noise_variance + 1e-8) * np.eye(len(x))
+        try:
+            cholesky = np.linalg.cholesky(covariance)
+        except np.linalg.LinAlgError:
+            return np.inf
+        alpha = np.linalg.solve(cholesky.T, np.linalg.solve(cholesky, y))
+        return 0.5 * y @ alpha + np.log(np.diag(cholesky)).sum()
+
+    def fit(self, design, responses):
+        """This method fits the Gaussian process to the responses of the points of the design"""
+        x = design_to_array(design, self.factors) if not isinstance(design, np.ndarray) else design
+        self.x = self.scale(x)
+        y = np.asarray(responses, dtype=float)
+        self.mean = y.mean()
+        self.std = y.std() if y.std() > 0 else 1
+        y = (y - self.mean) / self.std
+
+        start = np.zeros(x.shape[1] + 2)
+        start[-1] = np.log(0.1)
+        result = minimize(self.negative_log_likelihood, start, args=(self.x, y), method='L-BFGS-B',
+                          bounds=[(-5, 5)] * x.shape[1] + [(-5, 5), (-12, 2)])
+        self.length_scales = np.exp(result.x[:-2])
+        self.signal_variance, self.noise_variance = np.exp(result.x[-2:])
+
+        covariance = self.kernel(self.x, self.x, self.length_scales, self.signal_variance)
+        covariance += (self.noise_variance + 1e-8) * np.eye(len(self.x))
+        self.alpha = np.linalg.solve(covariance, y)
+        return self
+
+    def predict(self, x):
+        """This method returns the predicted output for the points x (an array with one column for each factor
+        or a list of {parameter: value})"""
+        x = design_to_array(x, self.factors) if not isinstance(x, np.ndarray) else np.atleast_2d(x)
+        covariance = self.kernel(self.scale(x), self.x, self.length_scales, self.signal_variance)
+        return self.mean + self.std * covariance @ self.alpha
+
+
+def sobol_indices(surrogate, factors, num_samples=2 ** 16, num_bootstrap=200, alpha=0.05, seed=None):
+    """Returns the first order and total Sobol indices of each factor, computed with the surrogate and
+    the factors uniformly distributed between their boundaries (Saltelli and Jansen estimators), and their
+    bootstrap confidence intervals (lower and upper columns). The surrogate is evaluated in
+    num_samples * (number of factors + 2) points"""
+
+    low = np.array([low for low, high in factors.values()], dtype=float)
+    high = np.array([high for low, high in factors.values()], dtype=float)
+    rng = np.random.default_rng(seed)
+    a = low + rng.uniform(size=(num_samples, len(factors))) * (high - low)
+    b = low + rng.uniform(size=(num_samples, len(factors))) * (high - low)
+
+    f_a = surrogate.predict(a)
+    f_b = surrogate.predict(b)
+    # One column for each factor: a with the column i of b
+    f_a_b = np.zeros((num_samples, len(factors)))
+    for i in range(len(factors)):
+        a_b = a.copy()
+        a_b[:, i] = b[:, i]
+        f_a_b[:, i] = surrogate.predict(a_b)
+
+    # Centre the outputs. The first order estimator multiplies outputs, so without centring its error grows with
+    # the mean of the output (for example, the throughput), that is large compared with its variation
+    mean = np.concatenate([f_a, f_b]).mean()
+    f_a, f_b, f_a_b = f_a - mean, f_b - mean, f_a_b - mean
+
+    def estimate(samples):
+        """Returns the first order and total indices computed with the given samples"""
+        variance = np.concatenate([f_a[samples], f_b[samples]]).var()
+        if variance == 0:
+            return np.zeros(len(factors)), np.zeros(len(factors))
+        differences = f_a_b[samples] - f_a[samples, None]
+        first_order = np.mean(f_b[samples, None] * differences, axis=0) / variance
+        total_order = 0.5 * np.mean(differences ** 2, axis=0) / variance
+        return first_order, total_order
+
+    first_order, total_order = estimate(np.arange(num_samples))
+
+    # Bootstrap: the indices computed with num_bootstrap resamples of the samples
+    bootstrap = np.array([estimate(rng.integers(0, num_samples, num_samples)) for _ in range(num_bootstrap)])
+    lower, upper = np.quantile(bootstrap, [alpha / 2, 1 - alpha / 2], axis=0)
+
+    return pd.DataFrame({
+        'factor': list(factors),
+        'first_order': first_order,
+        'first_order_lower': lower[0],
+        'first_order_upper': upper[0],
+        'total_order': total_order,
+        'total_order_lower': lower[1],
+        'total_order_upper': upper[1],
+    })
+
+
+def morris_indices(surrogate, factors, num_trajectories=100, num_levels=4, seed=None):
+    """Returns the Morris elementary effects of each factor computed with the surrogate: mu_star (mean of the
+    absolute effects, importance of the factor) and sigma (standard deviation, non linearity and interactions).
+    The effects are the change of the output when the factor goes from its low to its high boundary"""
+
+    low = np.array([low for low, high in factors.values()], dtype=float)
+    high = np.array([high for low, high in factors.values()], dtype=float)
+    num_factors = len(factors)
+    rng = np.random.default_rng(seed)
+    delta = num_levels / (2 * (num_levels - 1))
+    # Starting levels from which the factor can increase delta without leaving the unit hypercube
+    start_levels = np.arange(num_levels)[np.arange(num_levels) / (num_levels - 1) + delta <= 1 + 1e-9] / (num_levels - 1)
+
+    effects = np.zeros((num_trajectories, num_factors))
+    for trajectory in range(num_trajectories):
+        # Each trajectory changes the factors one by one in a random order
+        x = rng.choice(start_levels, size=num_factors)
+        points = [x.copy()]
+        order = rng.permutation(num_factors)
+        for i in order:
+            x[i] += delta
+            points.append(x.copy())
+        outputs = surrogate.predict(low + np.array(points) * (high - low))
+        effects[trajectory, order] = np.diff(outputs) / delta
+
+    return pd.DataFrame({
+        'factor': list(factors),
+        'mu': effects.mean(axis=0),
+        'mu_star': np.abs(effects).mean(axis=0),
+        'sigma': effects.std(axis=0, ddof=1),
+    })
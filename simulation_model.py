@@ -0,0 +1,295 @@
+# Import from libraries
+import simpy
+import random
+import numpy as np
+import pandas as pd
+from functools import partial
+
+# Import from files
+from parent_objects import Part, Store, CountingStore, MachineCheckQuality, MachineRepairPart, MachineAssembly
+from distributions import seed_samplers
+from tools import confidence_interval_bounds
+
+# Statistics (rows) and entities (columns) of each output table
+PARTS_STATISTICS = ['1_total_parts_in', '2_total_ok_used', '3_total_created']
+PARTS = ['part_A', 'part_B', 'finals']
+BUFFERS_STATISTICS = ['1_total_in', '2_total_out', '3_in_now']
+BUFFERS = ['b_A_ok', 'b_B_?', 'b_B_ko', 'b_B_ok', 'b_finals']
+MACHINES_STATISTICS = [
+    '1_%_waiting_time',
+    '2_%_working_time',
+    '3_%_blocking_time',
+    '4_total_parts_in',
+    '5_total_parts_out',
+    '6_parts_in_now',
+]
+MACHINES = ['m_check_B', 'm_repair_B', 'm_create_finals']
+
+# Position of each output in the result row of a replication: parts, buffers and then machines,
+# and inside each table, statistic by statistic
+RESULT_NAMES = (
+    [('parts', statistic, part) for statistic in PARTS_STATISTICS for part in PARTS]
+    + [('buffers', statistic, buffer) for statistic in BUFFERS_STATISTICS for buffer in BUFFERS]
+    + [('machines', statistic, machine) for statistic in MACHINES_STATISTICS for machine in MACHINES]
+)
+NUM_RESULTS = len(RESULT_NAMES)
+
+
+class SimulationModel(object):
+    """
+    This class represents the simulation model. It is created once and then it can run as many replications
+    as we want without creating the parts, buffers and machines again:
+
+        model = SimulationModel(...)
+        model.reset(seed)
+        row = model.run(until=simulation_time)
+
+    The parts, buffers, machines, distributions and the output array are reused. Each reset only creates a new simpy
+    environment, the simpy store of each buffer and the processes of the parts and machines.
+    Each replication returns its outputs as a numpy array with one value for each item of RESULT_NAMES.
+    Each final product needs final_product_partA_quantity parts A and final_product_partB_quantity parts B.
+    If counting_buffers is True, the buffers only keep the number of parts (see CountingStore), which is faster
+    and uses less memory when the buffers have a lot of parts. If counting_buffers_keep_order is also True, they keep
+    the order of arrival of the parts too (only needed if the parts of a buffer can be of different types).
+    """
+
+    def __init__(
+            self,
+            partA_arrival_distribution_lower_boundary,
+            partA_arrival_distribution_upper_boundary,
+            partB_arrival_distribution_lower_boundary,
+            partB_arrival_distribution_upper_boundary,
+            partA_batch_size,
+            partB_batch_size,
+            buffer_partA_ok_capacity,
+            buffer_partB_review_capacity,
+            buffer_partB_ok_capacity,
+            buffer_partB_ko_capacity,
+            buffer_final_products_capacity,
+            machine_check_quality_partB_cycle_time,
+            machine_repair_partB_cycle_time,
+            machine_create_final_products_cycle_time,
+            failure_rate_partB,
+            partA_arrival_distribution=None,
+            partB_arrival_distribution=None,
+            final_product_partA_quantity=1,
+            final_product_partB_quantity=1,
+            counting_buffers=False,
+            counting_buffers_keep_order=False
+    ):
+        # Create environment
+        self.env = simpy.Environment()
+
+        # Create the buffers (we create the buffers first because they are input for Parts and Machines)
+        if counting_buffers:
+            buffer_class = partial(CountingStore, keep_order=counting_buffers_keep_order)
+        else:
+            buffer_class = Store
+        self.buffer_partA_ok = buffer_class(self.env, name='b_A_ok', capacity=buffer_partA_ok_capacity)
+        self.buffer_partB_review = buffer_class(self.env, name='b_B_?', capacity=buffer_partB_review_capacity)
+        self.buffer_partB_ok = buffer_class(self.env, name='b_B_ok', capacity=buffer_partB_ok_capacity)
+        self.buffer_partB_ko = buffer_class(self.env, name='b_B_ko', capacity=buffer_partB_ko_capacity)
+        self.buffer_final_products = buffer_class(self.env, name='b_finals', capacity=buffer_final_products_capacity)
+
+        # Create the parts
+        if partA_arrival_distribution is None:
+            partA_arrival_distribution = {
+                'type': 'uniform',
+                'low': partA_arrival_distribution_lower_boundary,
+                'high': partA_arrival_distribution_upper_boundary,
+            }
+        if partB_arrival_distribution is None:
+            partB_arrival_distribution = {
+                'type': 'uniform',
+                'low': partB_arrival_distribution_lower_boundary,
+                'high': partB_arrival_distribution_upper_boundary,
+            }
+        self.partA = Part(
+            self.env,
+            name='part_A',
+            inter_arrival_time=partA_arrival_distribution,
+            batch_size=partA_batch_size,
+            input_buffer=self.buffer_partA_ok
+        )
+        self.partB = Part(
+            self.env,
+            name='part_B',
+            inter_arrival_time=partB_arrival_distribution,
+            batch_size=partB_batch_size,
+            input_buffer=self.buffer_partB_review
+        )
+
+        # Create the machines
+        self.machine_check_quality_partB = MachineCheckQuality(
+            self.env,
+            name='m_check_B',
+            input_buffer=self.buffer_partB_review,
+            cycle_time=machine_check_quality_partB_cycle_time,
+            failure_rate=failure_rate_partB,
+            output_buffer_ok=self.buffer_partB_ok,
+            output_buffer_ko=self.buffer_partB_ko
+        )
+        self.machine_repair_partB = MachineRepairPart(
+            self.env,
+            name='m_repair_B',
+            input_buffer=self.buffer_partB_ko,
+            cycle_time=machine_repair_partB_cycle_time,
+            output_buffer=self.buffer_partB_ok
+        )
+        self.machine_create_final_products = MachineAssembly(
+            self.env,
+            name='m_create_finals',
+            bill_of_materials=[
+                (self.buffer_partA_ok, final_product_partA_quantity),
+                (self.buffer_partB_ok, final_product_partB_quantity),
+            ],
+            cycle_time=machine_create_final_products_cycle_time,
+            output_buffer=self.buffer_final_products
+        )
+
+        self.buffers = [
+            self.buffer_partA_ok,
+            self.buffer_partB_review,
+            self.buffer_partB_ko,
+            self.buffer_partB_ok,
+            self.buffer_final_products,
+        ]
+        self.parts = [self.partA, self.partB]
+        self.machines = [
+            self.machine_check_quality_partB,
+            self.machine_repair_partB,
+            self.machine_create_final_products,
+        ]
+
+        # Distributions in the order in which they get their random streams
+        self.samplers = [
+            self.partA.inter_arrival_time,
+            self.partA.batch_size,
+            self.partB.inter_arrival_time,
+            self.partB.batch_size,
+            self.machine_check_quality_partB.cycle_time,
+            self.machine_repair_partB.cycle_time,
+            self.machine_create_final_products.cycle_time,
+        ]
+
+        # Array where the outputs of the last replication are written
+        self.row = np.zeros(NUM_RESULTS)
+
+    def reset(self, seed):
+        """This method empties the model and fixes the seed to run a new replication"""
+
+        # Fix the seed to get the same output each time that we run the simulation
+        random.seed(seed)
+        # Give a different random stream to each distribution (always in the same order to get the same output)
+        seed_samplers(self.samplers, seed)
+
+        # Move all the objects to a new environment (simpy can not empty an environment, so we create a new one
+        # and the buffers create their simpy stores in it)
+        self.env = simpy.Environment()
+        for simulation_object in self.buffers + self.parts + self.machines:
+            simulation_object.reset(self.env)
+
+        # Launch the events
+
+        # Create the parts arrivals
+        self.env.process(self.partA.generate_arrivals())
+        self.env.process(self.partB.generate_arrivals())
+
+        # Start main process for each machine
+        self.env.process(self.machine_check_quality_partB.check_quality())
+        self.env.process(self.machine_repair_partB.repair_part())
+        self.env.process(self.machine_create_final_products.assemble())
+
+    def run(self, until, out=None):
+        """This method runs the simulation until the given time and writes its outputs in out
+        (by default, in the row of the model). out can be, for example, a row of a bigger array."""
+
+        self.env.run(until=until)
+
+        row = self.row if out is None else out
+        position = 0
+
+        # Parts
+        row[position:position + 9] = [
+            self.buffer_partA_ok.total_parts_in,
+            self.buffer_partB_review.total_parts_in,
+            0,
+            self.buffer_partA_ok.total_parts_out,
+            self.buffer_partB_ok.total_parts_out,
+            0,
+            0,
+            0,
+            self.buffer_final_products.total_parts_in,
+        ]
+        position += 9
+
+        # Buffers
+        for buffer_number, buffer in enumerate(self.buffers):
+            row[position + buffer_number] = buffer.total_parts_in
+            row[position + len(self.buffers) + buffer_number] = buffer.total_parts_out
+            row[position + 2 * len(self.buffers) + buffer_number] = buffer.total_parts_in - buffer.total_parts_out
+        position += 3 * len(self.buffers)
+
+        # Machines
+        for machine_number, machine in enumerate(self.machines):
+            row[position + machine_number] = (machine.total_waiting_time / until) * 100
+            row[position + len(self.machines) + machine_number] = (machine.total_working_time / until) * 100
+            row[position + 2 * len(self.machines) + machine_number] = (machine.total_blocking_time / until) * 100
+            row[position + 3 * len(self.machines) + machine_number] = machine.total_parts_in
+            row[position + 4 * len(self.machines) + machine_number] = machine.total_parts_out
+            row[position + 5 * len(self.machines) + machine_number] = machine.parts_in_now()
+
+        return row
+
+
+def run_replications(replication_numbers, simulation_time, seed=40, **parameters):
+    """Creates the simulation model once and runs one replication for each replication number.
+    The seed of each replication is seed + replication number.
+    Returns an array with one row for each replication (see RESULT_NAMES)"""
+
+    model = SimulationModel(**parameters)
+    rows = np.zeros((len(replication_numbers), NUM_RESULTS))
+    for row, replication_number in zip(rows, replication_numbers):
+        model.reset(seed=seed + replication_number)
+        model.run(until=simulation_time, out=row)
+    return rows
+
+
+def results_to_dataframes(rows):
+    """Returns the tables with the main outputs for parts, buffers and machines from an array with one row for
+    each replication. The tables have one block of rows for each replication"""
+
+    rows = np.atleast_2d(rows)
+    dataframes = []
+    start = 0
+    for statistics, entities, decimals in [
+        (PARTS_STATISTICS, PARTS, None),
+        (BUFFERS_STATISTICS, BUFFERS, None),
+        (MACHINES_STATISTICS, MACHINES, 2),
+    ]:
+        end = start + len(statistics) * len(entities)
+        values = rows[:, start:end].reshape(-1, len(entities))
+        # Counters are integers and percentages are rounded to 2 decimals. We do it with numpy before creating
+        # the table, which is much faster than changing the columns of the table (this function is called once
+        # for each replication by run_one_replication)
+        values = values.astype(int) if decimals is None else values.round(decimals)
+        columns = {'statistics': statistics * len(rows)}
+        columns.update(zip(entities, values.T))
+        dataframes.append(pd.DataFrame(columns))
+        start = end
+
+    return tuple(dataframes)
+
+
+def results_summary(rows, alpha):
+    """Returns a table with the mean and the confidence interval for the mean of each output, from an array with
+    one row for each replication"""
+
+    rows = np.atleast_2d(rows)
+    mean, half_width = confidence_interval_bounds(rows, alpha=alpha, num_replications=len(rows))
+    df = pd.DataFrame(RESULT_NAMES, columns=['table', 'statistics', 'name'])
+    df['mean'] = mean
+    df['half_width'] = half_width
+    df['lower'] = mean - half_width
+    df['upper'] = mean + half_width
+    return df
@@ -1,3 +1,4 @@
+import numpy as np
 from statistics import mean, stdev
 from math import sqrt
 from scipy.stats import t
@@ -12,3 +13,15 @@ def confidence_interval(values, alpha, num_replications):
     t_value = t.ppf(1-alpha/2, df)
     # confidence interval for the mean of values
     return f'{round(mean(values), 1)} \u00B1 {round(t_value * stdev(values)/sqrt(num_replications), 1)}'
+
+
+def confidence_interval_bounds(values, alpha, num_replications):
+    """Returns the mean of a set of values and the half width of the confidence interval for the mean.
+    values can be an array with one row for each replication, and then the result has one value for each column"""
+
+    # degrees of freedom for the t-student
+    df = num_replications - 1
+    # value for a t-student with df degrees of freedom and a tail of alpha/2
+    t_value = t.ppf(1-alpha/2, df)
+    values = np.asarray(values, dtype=float)
+    return values.mean(axis=0), t_value * values.std(axis=0, ddof=1)/sqrt(num_replications)